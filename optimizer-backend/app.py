@@ -2,118 +2,485 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import pandas as pd
+import os
+import bisect
+import tempfile
+import pathlib
 import uuid
+import hashlib
+import pickle
 import threading
+import multiprocessing
 import concurrent.futures
-from optimizer import clean_data, run_gurobi_optimizer
+from concurrent.futures.process import BrokenProcessPool
+from collections import Counter, OrderedDict
+import numba
+from python_calamine import CalamineWorkbook
+from optimizer import clean_data, build_model, solve, check_solver_params, DEFAULT_SOLVER_PARAMS, CLEAN_DATA_VERSION
 
 app = Flask(__name__)
 # CORS allows the React app (on a different port) to call this backend
 CORS(app)
 
-# --- CHANGE: Global dictionary for jobs and a lock to make access thread-safe ---
+# --- CHANGE: Global dictionary of JobState objects. Each job has its own lock, so polling
+# one job never waits on updates to another. ---
 jobs = {}
-job_lock = threading.Lock()
 
 
-def optimization_worker(job_id, stations_df, pair_df, total_audience, current_budget, is_final_run, time_limit, num_points):
+class JobState:
     """
-    Worker function for a single optimization point. This is executed in a separate thread.
+    Status, progress and results of one optimization job.
+    All reads and writes go through the job's own lock, and every change bumps
+    `version` so unchanged jobs can be detected without serializing them.
     """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._status = 'Pending'
+        self._main_result = None
+        self._reach_curve = []
+        self._progress = 0
+        self._error = None
+
+    def set_status(self, status):
+        with self._lock:
+            self._status = status
+            self._version += 1
+
+    def fail(self, error):
+        with self._lock:
+            self._status = 'Error'
+            self._error = error
+            self._version += 1
+
+    def complete(self):
+        with self._lock:
+            if self._status != 'Error':
+                self._status = 'Completed'
+                self._version += 1
+
+    def add_progress(self, amount):
+        with self._lock:
+            self._progress += amount
+            self._version += 1
+
+    def add_point(self, budget, reach, progress, main_result=None):
+        """Adds a reach curve point (kept ordered by budget) and advances progress."""
+        with self._lock:
+            bisect.insort(self._reach_curve, {"budget": budget, "reach": reach}, key=lambda p: p['budget'])
+            self._progress += progress
+            # The run for the maximum budget provides the full result for the UI cards
+            if main_result is not None:
+                self._main_result = main_result
+            self._version += 1
+
+    @property
+    def version(self):
+        with self._lock:
+            return self._version
+
+    def snapshot(self):
+        """Returns a copy of the job as a dict, safe to serialize while the job keeps running."""
+        with self._lock:
+            return {
+                'status': self._status,
+                'main_result': self._main_result,
+                'reach_curve': list(self._reach_curve),
+                'progress': self._progress,
+                'error': self._error
+            }
+
+# --- CHANGE: Reach curve points are solved in one pool of worker processes shared by all jobs.
+# Each process runs a single-threaded Gurobi solve in its own address space, so the GIL is
+# never contended and all jobs together never run more solver threads than there are cores. ---
+SOLVER_PROCESSES = os.cpu_count() or 1
+solver_pool = None
+solver_pool_lock = threading.Lock()
+
+# Inside each worker process: the models built so far, keyed by upload and settings
+WORKER_MODEL_CACHE_SIZE = 2
+worker_models = OrderedDict()
+
+# --- Optional solver settings accepted as form fields:
+# field name -> (Gurobi parameter, type, min, max), using Gurobi's allowed ranges ---
+SOLVER_FORM_FIELDS = {
+    'mipGap': ('MIPGap', float, 0.0, float('inf')),
+    'mipFocus': ('MIPFocus', int, 0, 3),
+    'heuristics': ('Heuristics', float, 0.0, 1.0),
+    'presolve': ('Presolve', int, -1, 2),
+}
+# Intermediate reach curve points only need a near-optimal estimate, so they stop at a looser gap
+CURVE_MIP_GAP = 0.02
+
+# Only these columns are used by clean_data; reading just them keeps the parse small.
+EXCEL_COLUMNS = [
+    'AQH1_Concatenate', 'AQH1_Cost-P18+', 'Cume1',
+    'AQH2_Concatenate', 'AQH2_Cost-P18+', 'Cume2',
+    'Combined Cume'
+]
+
+# --- Cache of cleaned (stations_df, pair_df), keyed by (sha256 of the file, sheet name) ---
+# Re-running a job on the same file (e.g. while tuning the budget) skips parsing and cleaning.
+# Recent entries are kept in memory; every entry is also written to disk as parquet so it
+# survives restarts of the server. The disk cache is capped in size, evicting the least
+# recently used entries (by file mtime) that no running job needs.
+PREP_CACHE_SIZE = 8
+prep_cache = OrderedDict()
+prep_cache_lock = threading.Lock()
+CACHE_DIR = pathlib.Path(os.environ.get('REXSOLVER_CACHE', os.path.join(tempfile.gettempdir(), 'rexsolver')))
+DISK_CACHE_MAX_BYTES = int(os.environ.get('REXSOLVER_CACHE_MAX_MB', '1024')) * 1024 * 1024
+# Cache keys of running jobs (guarded by prep_cache_lock); their worker processes read these files
+active_cache_keys = Counter()
+
+
+def file_sha256(file_path):
+    """Hashes a file in chunks so it never has to be held in memory."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def disk_cache_name(key):
+    """Returns the file name prefix of a cache key's disk entry."""
+    file_hash, sheet_name = key
+    # Hash the sheet name too, as it may contain characters that aren't valid in file names
+    return f"{file_hash.hex()}_{hashlib.sha256(sheet_name.encode()).hexdigest()[:16]}_v{CLEAN_DATA_VERSION}"
+
+
+def disk_cache_paths(key):
+    """Returns the parquet paths (stations, pairs) for a cache key."""
+    name = disk_cache_name(key)
+    return CACHE_DIR / f"{name}.stations.parquet", CACHE_DIR / f"{name}.pairs.parquet"
+
+
+def touch_disk_cache(key):
+    """Marks a disk entry as recently used, so pruning evicts it last."""
     try:
-        result = run_gurobi_optimizer(stations_df, pair_df, total_audience, current_budget, time_limit=time_limit)
+        os.utime(disk_cache_paths(key)[0])
+    except OSError:
+        pass  # Not on disk (e.g. the write failed); nothing to keep
 
-        if "error" in result:
-            print(f"Warning: Could not solve for budget {current_budget}. Error: {result['error']}")
-            # Still update progress to show the task is complete
-            with job_lock:
-                jobs[job_id]['progress'] += 1 / num_points
-            return
 
-        with job_lock:
-            # Update the shared reach curve data
-            jobs[job_id]['reach_curve'].append({
-                "budget": result["total_cost"],
-                "reach": result["net_reach_percentage"]
-            })
-            jobs[job_id]['reach_curve'].sort(key=lambda p: p['budget'])
+def prune_disk_cache():
+    """
+    Deletes disk entries until the cache fits in DISK_CACHE_MAX_BYTES. Entries written by
+    an older CLEAN_DATA_VERSION go first, then the least recently used ones. Entries of
+    running jobs are never deleted.
+    """
+    try:
+        # name -> [total size, latest mtime] of its parquet files
+        entries = {}
+        for path in CACHE_DIR.glob('*.parquet'):
+            stat = path.stat()
+            entry = entries.setdefault(path.name.split('.', 1)[0], [0, 0.0])
+            entry[0] += stat.st_size
+            entry[1] = max(entry[1], stat.st_mtime)
 
-            # Update progress
-            jobs[job_id]['progress'] += 1 / num_points
+        with prep_cache_lock:
+            in_use = {disk_cache_name(key) for key in active_cache_keys}
 
-            # If this is the run for the maximum budget, set its full result as the main one for the UI cards
-            if is_final_run:
-                jobs[job_id]['main_result'] = result
+        current_suffix = f"_v{CLEAN_DATA_VERSION}"
+        total_size = sum(size for size, _ in entries.values())
+        for name, (size, _) in sorted(entries.items(), key=lambda e: (e[0].endswith(current_suffix), e[1][1])):
+            if name.endswith(current_suffix) and total_size <= DISK_CACHE_MAX_BYTES:
+                break
+            if name in in_use:
+                continue
+            # Delete the stations file first, so readers see a miss rather than a partial entry
+            for kind in ('stations', 'pairs'):
+                (CACHE_DIR / f"{name}.{kind}.parquet").unlink(missing_ok=True)
+            total_size -= size
+    except OSError as e:
+        print(f"Warning: Could not prune the disk cache: {e}")
 
-    except Exception as e:
-        print(f"Exception in worker for budget {current_budget}: {e}")
-        with job_lock:
-            # Mark progress as complete even on error to prevent a stuck progress bar
-            jobs[job_id]['progress'] += 1 / num_points
+
+def read_disk_cache(key):
+    """Returns the (stations_df, pair_df) stored on disk for a key, or None if it isn't there."""
+    stations_path, pairs_path = disk_cache_paths(key)
+    # The stations file is written last, so if it exists the pairs file is complete too
+    if not stations_path.exists():
+        return None
+    return pd.read_parquet(stations_path), pd.read_parquet(pairs_path)
+
+
+def remember_data(key, stations_df, pair_df):
+    """Stores cleaned data in memory, evicting the least recently used entry when full."""
+    with prep_cache_lock:
+        prep_cache[key] = (stations_df, pair_df)
+        prep_cache.move_to_end(key)
+        while len(prep_cache) > PREP_CACHE_SIZE:
+            prep_cache.popitem(last=False)
+    return stations_df.copy(deep=False), pair_df.copy(deep=False)
+
+
+def get_cached_data(key):
+    """
+    Returns the cached (stations_df, pair_df) for a key, or None on a miss.
+    Looks in memory first, then on disk. The frames are shallow copies so callers
+    can't modify the cached ones.
+    """
+    with prep_cache_lock:
+        cached = prep_cache.get(key)
+        if cached is not None:
+            prep_cache.move_to_end(key)
+    if cached is not None:
+        stations_df, pair_df = cached
+        # The disk entry may have been pruned or deleted since; the workers need it, so restore it
+        if disk_cache_paths(key)[0].exists():
+            touch_disk_cache(key)
+        else:
+            write_disk_cache(key, stations_df, pair_df)
+        return stations_df.copy(deep=False), pair_df.copy(deep=False)
+
+    prepared = read_disk_cache(key)
+    if prepared is None:
+        return None
+    touch_disk_cache(key)
+    return remember_data(key, *prepared)
+
+
+def write_disk_cache(key, stations_df, pair_df):
+    """
+    Writes cleaned data to the disk cache, then prunes it. Only prints a warning on failure;
+    jobs then send the data to the worker processes with each point instead.
+    """
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        for df, path in zip((pair_df, stations_df), reversed(disk_cache_paths(key))):
+            # Write to a temporary name and rename, so readers never see a partial file
+            tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+            df.to_parquet(tmp_path, compression='zstd')
+            os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Warning: Could not write cleaned data to the disk cache in {CACHE_DIR}: {e}")
+    prune_disk_cache()
+
+
+def cache_data(key, stations_df, pair_df):
+    """Stores cleaned data in memory and on disk."""
+    write_disk_cache(key, stations_df, pair_df)
+    return remember_data(key, stations_df, pair_df)
 
 
-def run_optimization_jobs(job_id, file_content, total_audience, max_budget, sheet_name):
+def init_solver_process():
+    """
+    Runs once in each worker process. There is one process per core, each solving with a
+    single thread, so the Numba kernel in build_model gets a single thread as well.
+    """
+    numba.set_num_threads(1)
+
+
+def get_solver_pool():
+    """Returns the shared worker process pool, creating it on first use."""
+    global solver_pool
+    with solver_pool_lock:
+        if solver_pool is None:
+            # 'spawn' avoids forking a process that is running Flask, Gurobi and OpenMP threads
+            solver_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=SOLVER_PROCESSES,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_solver_process
+            )
+        return solver_pool
+
+
+def discard_solver_pool(pool):
+    """
+    Drops a broken pool (one of its processes died, e.g. killed for using too much memory),
+    so the next job gets a new one. Another job may already have replaced it.
+    """
+    global solver_pool
+    with solver_pool_lock:
+        if solver_pool is pool:
+            solver_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def get_worker_model(cache_key, total_audience, solver_params, prepared_pickle=None):
+    """
+    Runs in a worker process. Returns this process's model for an upload, building it
+    the first time from the cleaned data in the disk cache, or from `prepared_pickle`
+    (the pickled (stations_df, pair_df)) when the job couldn't write it there.
+    """
+    model_key = (cache_key, total_audience, tuple(sorted(solver_params.items())))
+    entry = worker_models.get(model_key)
+    if entry is None:
+        if prepared_pickle is not None:
+            prepared = pickle.loads(prepared_pickle)
+        else:
+            # Read straight from disk: the frames are only needed to build the model, which is kept
+            prepared = read_disk_cache(cache_key)
+            if prepared is None:
+                raise RuntimeError("The cleaned data for this upload is missing from the disk cache.")
+        model, x, budget_constr = build_model(*prepared, total_audience, threads=1, params=solver_params)
+        entry = {'model': model, 'x': x, 'budget_constr': budget_constr, 'last_plan': None}
+        worker_models[model_key] = entry
+        while len(worker_models) > WORKER_MODEL_CACHE_SIZE:
+            worker_models.popitem(last=False)[1]['model'].dispose()
+    worker_models.move_to_end(model_key)
+    return entry
+
+
+def optimization_worker(cache_key, total_audience, solver_params, current_budget, time_limit, mip_gap, is_final_run,
+                        prepared_pickle=None):
+    """
+    Worker function for a single optimization point. This is executed in a worker process.
+    The model is built once per process; later points only change its budget.
+    """
+    entry = get_worker_model(cache_key, total_audience, solver_params, prepared_pickle)
+    model, x = entry['model'], entry['x']
+
+    # Warm-start from the last plan this process found, if it is still affordable
+    start = entry['last_plan']
+    if start is not None and model._costs @ start > current_budget:
+        start = None
+
+    result = solve(
+        model, x, entry['budget_constr'], current_budget,
+        time_limit=time_limit, start=start, mip_gap=mip_gap,
+        return_plan=is_final_run  # Only the final run's plan is shown in the UI
+    )
+    if "error" not in result:
+        entry['last_plan'] = x.X.round()
+    return result
+
+
+def run_optimization_jobs(job_id, file_path, total_audience, max_budget, sheet_name, solver_params=None):
     """
     This function runs in a background thread.
-    It prepares data and then launches multiple parallel optimization jobs.
+    It prepares data and then solves the reach curve points in the worker process pool.
+    The uploaded file at `file_path` is deleted when the job finishes.
     """
+    cache_key = None
+    pool = None
     try:
-        # --- 1. Data Prep ---
-        with job_lock:
-            jobs[job_id]['status'] = 'Preparing data...'
-
-        xls = pd.ExcelFile(file_content)
-        # --- CHANGE: Use the user-provided sheet name ---
-        if sheet_name not in xls.sheet_names:
-            with job_lock:
-                jobs[job_id]['status'] = 'Error'
-                jobs[job_id]['error'] = f"Sheet '{sheet_name}' not found. Available sheets: {', '.join(xls.sheet_names)}"
+        # Reject settings Gurobi doesn't accept here, rather than in every worker
+        solver_params = solver_params or {}
+        params_error = check_solver_params(solver_params)
+        if params_error:
+            jobs[job_id].fail(params_error)
             return
 
-        df = pd.read_excel(xls, sheet_name=sheet_name)
-        stations_df, pair_df = clean_data(df)
+        # --- 1. Data Prep ---
+        jobs[job_id].set_status('Preparing data...')
+
+        cache_key = (file_sha256(file_path), sheet_name)
+        # Keep this job's disk cache entry from being pruned while its workers may read it
+        with prep_cache_lock:
+            active_cache_keys[cache_key] += 1
+        prepared = get_cached_data(cache_key)
+
+        if prepared is None:
+            # --- CHANGE: Read sheet names with calamine instead of a full openpyxl parse ---
+            sheet_names = CalamineWorkbook.from_path(file_path).sheet_names
+            # --- CHANGE: Use the user-provided sheet name ---
+            if sheet_name not in sheet_names:
+                jobs[job_id].fail(f"Sheet '{sheet_name}' not found. Available sheets: {', '.join(sheet_names)}")
+                return
+
+            df = pd.read_excel(
+                file_path,
+                sheet_name=sheet_name,
+                engine='calamine',
+                usecols=EXCEL_COLUMNS,
+                dtype={'AQH1_Concatenate': str, 'AQH2_Concatenate': str}
+            )
+            prepared = cache_data(cache_key, *clean_data(df))
 
-        # --- 2. Incrementally Generate Reach Curve in PARALLEL ---
-        with job_lock:
-            jobs[job_id]['status'] = 'Generating reach curve...'
+        # The worker processes load the cleaned data from the disk cache. If it couldn't be
+        # written there, every point carries a copy instead, pickled once here.
+        prepared_pickle = None
+        if not disk_cache_paths(cache_key)[0].exists():
+            print(f"Warning: The disk cache in {CACHE_DIR} is unavailable; sending job {job_id}'s data to the workers directly.")
+            prepared_pickle = pickle.dumps(prepared, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # --- 2. Generate the reach curve in the worker process pool ---
+        jobs[job_id].set_status('Generating reach curve...')
+
+        curve_mip_gap = max(CURVE_MIP_GAP, solver_params.get('MIPGap', DEFAULT_SOLVER_PARAMS['MIPGap']))
 
         num_points = 10
         budget_points = [(max_budget / num_points) * i for i in range(0, num_points + 1)]
+        progress_step = 1 / len(budget_points)
 
-        # --- CHANGE: Use a ThreadPoolExecutor to run all budget optimizations concurrently ---
-        with concurrent.futures.ThreadPoolExecutor(max_workers=num_points) as executor:
-            # Submit all tasks to the pool. Each task will run `optimization_worker`.
-            future_to_budget = {
-                executor.submit(
-                    optimization_worker,
-                    job_id,
-                    stations_df,
-                    pair_df,
-                    total_audience,
-                    budget,
-                    is_final_run=(i == len(budget_points) - 1),  # True only for the last budget point
-                    time_limit=30+(i*15) + (i == len(budget_points) - 1)*30, # Extra 30 for last point
-                    num_points=num_points
-                ): budget for i, budget in enumerate(budget_points)
-            }
+        # Submit all tasks to the pool, smallest budget first, so a worker's previous plan
+        # is usually affordable as the warm start for its next point.
+        pool = get_solver_pool()
+        future_to_point = {}
+        for i, budget in enumerate(budget_points):
+            is_final_run = i == len(budget_points) - 1  # True only for the last budget point
+            future = pool.submit(
+                optimization_worker,
+                cache_key,
+                total_audience,
+                solver_params,
+                budget,
+                time_limit=30 + (i * 15) + is_final_run * 30,  # Extra 30 for last point
+                mip_gap=None if is_final_run else curve_mip_gap,
+                is_final_run=is_final_run,
+                prepared_pickle=prepared_pickle
+            )
+            future_to_point[future] = (budget, is_final_run)
 
-            # This loop will check for exceptions that might have occurred in the worker threads
-            for future in concurrent.futures.as_completed(future_to_budget):
-                budget = future_to_budget[future]
-                try:
-                    future.result()  # re-raises any exception from the worker
-                except Exception as exc:
-                    print(f'Job {job_id} task for budget {budget} generated an exception: {exc}')
+        # Results are recorded here, in the job's own thread, as each point finishes
+        final_error = None
+        for future in concurrent.futures.as_completed(future_to_point):
+            budget, is_final_run = future_to_point[future]
+            try:
+                result = future.result()  # re-raises any exception from the worker
+            except BrokenProcessPool:
+                raise  # No point of this job can finish; handled below
+            except Exception as exc:
+                print(f'Job {job_id} task for budget {budget} generated an exception: {exc}')
+                if is_final_run:
+                    final_error = str(exc)
+                # Mark progress as complete even on error to prevent a stuck progress bar
+                jobs[job_id].add_progress(progress_step)
+                continue
+
+            if "error" in result:
+                print(f"Warning: Could not solve for budget {budget}. Error: {result['error']}")
+                if is_final_run:
+                    final_error = result['error']
+                # Still update progress to show the task is complete
+                jobs[job_id].add_progress(progress_step)
+                continue
 
-        with job_lock:
-             if jobs[job_id]['status'] != 'Error':
-                jobs[job_id]['status'] = 'Completed'
+            # If this is the run for the maximum budget, its full result becomes the main one for the UI cards
+            jobs[job_id].add_point(
+                result["total_cost"],
+                result["net_reach_percentage"],
+                progress_step,
+                main_result=result if is_final_run else None
+            )
+
+        # Without the maximum budget point there is no main result to show (and if every
+        # point failed, e.g. on a missing cache file, the curve is empty too)
+        if final_error is not None:
+            jobs[job_id].fail(f"Could not solve for the maximum budget: {final_error}")
+            return
+
+        jobs[job_id].complete()
+
+    except BrokenProcessPool as e:
+        print(f"Error in main job thread {job_id}: {e}")
+        discard_solver_pool(pool)
+        jobs[job_id].fail("A solver process stopped unexpectedly. Please run the job again.")
 
     except Exception as e:
         print(f"Error in main job thread {job_id}: {e}")
-        with job_lock:
-            jobs[job_id]['status'] = 'Error'
-            jobs[job_id]['error'] = f"An unexpected error occurred: {str(e)}"
+        jobs[job_id].fail(f"An unexpected error occurred: {str(e)}")
+
+    finally:
+        if cache_key is not None:
+            with prep_cache_lock:
+                active_cache_keys[cache_key] -= 1
+                if not active_cache_keys[cache_key]:
+                    del active_cache_keys[cache_key]
+        os.remove(file_path)
 
 @app.route('/start-optimization', methods=['POST'])
 def start_job():
@@ -131,27 +498,40 @@ def start_job():
         if not sheet_name:
             return jsonify({"error": "Sheet Name is required"}), 400
 
-        file_content = file.read()
+        if total_audience <= 0:
+            return jsonify({"error": "Total Audience must be a positive number."}), 400
+
+        # --- CHANGE: Optional solver tuning from the form ---
+        solver_params = {}
+        for field, (param, cast, low, high) in SOLVER_FORM_FIELDS.items():
+            value = request.form.get(field)
+            if value:
+                try:
+                    value = cast(value)
+                except ValueError:
+                    value = None
+                # The range check also rejects NaN
+                if value is None or not low <= value <= high:
+                    return jsonify({"error": f"Invalid value for {field}"}), 400
+                solver_params[param] = value
+
+        # --- CHANGE: Stream the upload to a temporary file instead of reading it into memory ---
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
+            file.save(tmp)
+        file_path = tmp.name
     except (TypeError, ValueError):
         return jsonify({"error": "Invalid Total Audience or Budget"}), 400
 
     # --- Create and Start Job ---
     job_id = str(uuid.uuid4())
 
-    # Use the lock to safely add the new job to the dictionary
-    with job_lock:
-        jobs[job_id] = {
-            'status': 'Pending',
-            'main_result': None,
-            'reach_curve': [],
-            'progress': 0,
-            'error': None
-        }
+    # Adding a single key to the dictionary is atomic, so no global lock is needed
+    jobs[job_id] = JobState()
 
     # Run the long process in a background thread
     thread = threading.Thread(
         target=run_optimization_jobs,
-        args=(job_id, file_content, total_audience, budget, sheet_name)
+        args=(job_id, file_path, total_audience, budget, sheet_name, solver_params)
     )
     thread.start()
 
@@ -159,13 +539,22 @@ def start_job():
 
 @app.route('/job-status/<job_id>', methods=['GET'])
 def get_job_status(job_id):
-    # Use the lock to safely read from the jobs dictionary
-    with job_lock:
-        job = jobs.get(job_id)
-        if not job:
-            return jsonify({"error": "Job not found"}), 404
-        # Return a copy to avoid race conditions if the job object is modified while being sent
-        return jsonify(job.copy())
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    # --- CHANGE: Answer polls for an unchanged job with 304 Not Modified instead of re-sending it.
+    # The version is read before the snapshot, so an ETag is never newer than the data it tags. ---
+    etag = f"{job_id}-{job.version}"
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        # Return a snapshot (taken under the job's own lock) so the job can keep running while it is sent
+        response = jsonify(job.snapshot())
+    response.set_etag(etag)
+    # Let the browser cache the status but always revalidate it on the next poll
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 if __name__ == '__main__':
     # Run the app on port 5001 to avoid conflicts with React's default port 3000
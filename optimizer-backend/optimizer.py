@@ -1,132 +1,242 @@
 # optimizer.py
+import math
 import pandas as pd
 import numpy as np
+from numba import config, njit, prange
+import scipy.sparse as sp
 import gurobipy as gp
 from gurobipy import GRB
 
+# Prefer OpenMP for Numba's parallel kernels: they run in background job threads, and
+# the TBB layer can hang interpreter shutdown after being used from a non-main thread.
+config.THREADING_LAYER_PRIORITY = ['omp', 'tbb', 'workqueue']
+
+# Default Gurobi settings, overridable per job (e.g. MIPFocus, Heuristics, Presolve).
+# The reach curve doesn't need proven optimality, so a 1% gap is enough.
+DEFAULT_SOLVER_PARAMS = {
+    'MIPGap': 0.01,  # Target a 1% optimality gap
+}
+
+# Bump whenever clean_data's output changes, so cleaned data cached by an older version isn't reused
+CLEAN_DATA_VERSION = 1
+
+def to_numeric_stripped(series, chars):
+    """Converts a column to numbers after removing formatting characters such as '$' and ','."""
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    # Plain (non-regex) character replacement over the whole column at once
+    values = series.to_numpy(dtype=object).astype('U')
+    for char in chars:
+        values = np.char.replace(values, char, '')
+    try:
+        numbers = values.astype(np.float64)
+    except ValueError:
+        # Some cells are not numbers; fall back to the slower coercing parse
+        numbers = pd.to_numeric(values, errors='coerce')
+    return pd.Series(numbers, index=series.index)
+
 def clean_data(df):
     """Cleans the raw dataframe from the XLSX file."""
-    # This function remains unchanged as it correctly prepares the data.
-    df1 = df[['AQH1_Concatenate', 'AQH1_Cost-P18+', 'Cume1']].copy()
-    df1.rename(columns={
-        'AQH1_Concatenate': 'Station',
-        'AQH1_Cost-P18+': 'Cost',
-        'Cume1': 'Cume'
-    }, inplace=True)
-
-    df2 = df[['AQH2_Concatenate', 'AQH2_Cost-P18+', 'Cume2']].copy()
-    df2.rename(columns={
-        'AQH2_Concatenate': 'Station',
-        'AQH2_Cost-P18+': 'Cost',
-        'Cume2': 'Cume'
-    }, inplace=True)
-
-    unique_stations_df = pd.concat([df1, df2]).drop_duplicates(subset='Station').reset_index(drop=True)
+    # Stack the station 1 and station 2 columns into a single Station/Cost/Cume frame
+    stacked = pd.concat([
+        df[['AQH1_Concatenate', 'AQH1_Cost-P18+', 'Cume1']].rename(columns={
+            'AQH1_Concatenate': 'Station',
+            'AQH1_Cost-P18+': 'Cost',
+            'Cume1': 'Cume'
+        }),
+        df[['AQH2_Concatenate', 'AQH2_Cost-P18+', 'Cume2']].rename(columns={
+            'AQH2_Concatenate': 'Station',
+            'AQH2_Cost-P18+': 'Cost',
+            'Cume2': 'Cume'
+        })
+    ], ignore_index=True)
+
+    unique_stations_df = stacked.drop_duplicates('Station', keep='first', ignore_index=True)
 
     for col in ['Cost', 'Cume']:
-        unique_stations_df[col] = pd.to_numeric(unique_stations_df[col].astype(str).str.replace('[$,]', '', regex=True), errors='coerce')
+        unique_stations_df[col] = to_numeric_stripped(unique_stations_df[col], '$,')
 
     unique_stations_df.dropna(inplace=True)
     unique_stations_df = unique_stations_df[unique_stations_df['Cost'] > 0]
 
-    pair_df = df[['AQH1_Concatenate', 'AQH2_Concatenate', 'Combined Cume']].copy()
-    pair_df.rename(columns={
+    pair_df = df[['AQH1_Concatenate', 'AQH2_Concatenate', 'Combined Cume']].rename(columns={
         'AQH1_Concatenate': 'Station1',
         'AQH2_Concatenate': 'Station2'
-    }, inplace=True)
-    pair_df['Combined Cume'] = pd.to_numeric(pair_df['Combined Cume'].astype(str).str.replace(',', '', regex=True), errors='coerce')
+    })
+    pair_df['Combined Cume'] = to_numeric_stripped(pair_df['Combined Cume'], ',')
     pair_df.dropna(inplace=True)
 
+    # Keep only pairs whose stations both survived cleaning, so the model never has to check
+    known_stations = set(unique_stations_df['Station'])
+    pair_df = pair_df[pair_df['Station1'].isin(known_stations) & pair_df['Station2'].isin(known_stations)]
+
     return unique_stations_df, pair_df
 
-def run_gurobi_optimizer(stations_df, pair_df, total_audience, budget, time_limit=60):
+@njit(parallel=True, fastmath=True, cache=True)
+def _build_dij(s1_idx, s2_idx, r_i, lambdas, R12, d_vals):
+    """
+    Computes the duplication dᵢⱼ of every station pair into `d_vals` in a single fused pass.
+    Returns the number of pairs with inconsistent data.
+    """
+    inconsistent = 0
+    for k in prange(len(s1_idx)):
+        i, j = s1_idx[k], s2_idx[k]
+
+        # --- Derive the covariance term λ_Wᵢⱼ ---
+        # λ_Wᵢⱼ = λᵢ + λⱼ + ln(1 - rᵢ - rⱼ + Rᵢⱼ)
+        log_arg = 1.0 - r_i[i] - r_i[j] + R12[k]
+
+        lambda_W = 0.0  # Default to independence if data is inconsistent
+        if log_arg > 0:
+            lambda_W = lambdas[i] + lambdas[j] + math.log(log_arg)
+        else:
+            # This indicates inconsistent data (e.g., Combined Cume < Cume1).
+            inconsistent += 1
+
+        # The covariance term must be non-negative in this model.
+        lambda_W = max(lambda_W, 0.0)
+
+        # --- Calculate the final model duplication dᵢⱼ for the Gurobi objective ---
+        # dᵢⱼ = 1 – e^-(λᵢ + λⱼ − λ_Wᵢⱼ)
+        d_vals[k] = -math.expm1(-(lambdas[i] + lambdas[j] - lambda_W))
+    return inconsistent
+
+def greedy_start(costs, r_i, budget):
     """
-    Runs the quadratic optimizer based on a second-order Poisson reach approximation.
+    Builds a quick feasible plan used to warm-start Gurobi.
+    Stations are taken in order of reach per dollar while they still fit in the budget.
+    """
+    start = np.zeros(len(costs))
+    remaining = budget
+    for i in np.argsort(-r_i / costs, kind='stable'):
+        if costs[i] <= remaining:
+            start[i] = 1.0
+            remaining -= costs[i]
+    return start
+
+def build_model(stations_df, pair_df, total_audience, threads=0, params=None):
+    """
+    Builds the quadratic reach model based on a second-order Poisson reach approximation.
     This implementation calibrates a correlated Poisson model to the provided Cume data
     to create a robust quadratic objective function for Gurobi.
-    """
-    if total_audience <= 0:
-        return {"error": "Total Audience must be a positive number."}
 
+    The budget only appears as the right-hand side of the budget constraint, so the
+    model is built once and re-solved for each budget with `solve`.
+    `threads` caps the threads Gurobi uses (0 = all cores) and `params` overrides
+    entries of DEFAULT_SOLVER_PARAMS.
+    Returns (model, x, budget_constr).
+    """
     stations = stations_df['Station'].tolist()
-    costs = stations_df.set_index('Station')['Cost'].to_dict()
-    cumes = stations_df.set_index('Station')['Cume'].to_dict()
+    # Station data as arrays aligned with `x`, computed once per model and reused by every solve
+    costs = stations_df['Cost'].to_numpy(dtype=np.float64)
+    cumes = stations_df['Cume'].to_numpy(dtype=np.float64)
     epsilon = 1e-9  # A small number to prevent log(0) for stations with 100% reach
 
     # --- ALGORITHM STEP 1: Calculate Individual Reach (rᵢ) and Mean Exposures (λᵢ) ---
     # rᵢ = 1 - e^(-λᵢ)  =>  λᵢ = -ln(1 - rᵢ)
 
-    r_i = {s: cumes[s] / total_audience for s in stations}
     # Ensure reach is not >= 1, which would lead to infinite lambda
-    for s in r_i:
-        if r_i[s] >= 1.0:
-            r_i[s] = 1.0 - epsilon
-
-    lambdas = {s: -np.log(1 - r_i[s]) for s in stations}
+    r_i = np.minimum(cumes / total_audience, 1.0 - epsilon)
+    lambdas = -np.log1p(-r_i)
 
     # --- ALGORITHM STEP 2: Derive Covariance (λ_Wᵢⱼ) and Final Duplication (dᵢⱼ) ---
     # We calibrate the model's covariance term (λ_Wᵢⱼ) to match the empirical
-    # duplication observed in the data.
-
-    d_ij = {}
-    for _, row in pair_df.iterrows():
-        s1_name, s2_name = row['Station1'], row['Station2']
+    # duplication observed in the data. All pairs are computed at once by `_build_dij`.
 
-        # Ensure both stations in the pair exist in our main station list
-        if s1_name in stations and s2_name in stations:
-            # For consistent dictionary keys, always order station names alphabetically
-            s1, s2 = min(s1_name, s2_name), max(s1_name, s2_name)
+    # Map station names to their position in `stations` (-1 if not in our main station list;
+    # clean_data already drops such pairs, this guards against other callers)
+    station_index = pd.Index(stations)
+    s1_idx = station_index.get_indexer(pair_df['Station1'])
+    s2_idx = station_index.get_indexer(pair_df['Station2'])
+    valid = (s1_idx >= 0) & (s2_idx >= 0)
 
-            # Get individual reach probabilities and lambdas for the pair
-            r1, r2 = r_i[s1], r_i[s2]
-            lambda1, lambda2 = lambdas[s1], lambdas[s2]
+    # For consistent keys, always put the lower station index first (D is upper-triangular)
+    s1_idx, s2_idx = np.minimum(s1_idx[valid], s2_idx[valid]), np.maximum(s1_idx[valid], s2_idx[valid])
 
-            # Calculate the combined reach probability from the data
-            R12 = row['Combined Cume'] / total_audience
+    # Calculate the combined reach probability from the data
+    R12 = pair_df['Combined Cume'].to_numpy(dtype=np.float64)[valid] / total_audience
 
-            # --- Derive the covariance term λ_Wᵢⱼ ---
-            # λ_Wᵢⱼ = λᵢ + λⱼ + ln(1 - rᵢ - rⱼ + Rᵢⱼ)
-            log_arg = 1 - r1 - r2 + R12
+    duplication_prob = np.empty(len(s1_idx))
+    inconsistent = _build_dij(s1_idx, s2_idx, r_i, lambdas, R12, duplication_prob)
+    if inconsistent:
+        # The most robust fallback is to assume independence (covariance = 0).
+        print(f"Warning: Inconsistent data for {inconsistent} station pairs. Combined reach is too low. Assuming independence.")
 
-            lambda_W = 0  # Default to independence if data is inconsistent
-            if log_arg > 0:
-                lambda_W = lambda1 + lambda2 + np.log(log_arg)
-            else:
-                # This indicates inconsistent data (e.g., Combined Cume < Cume1).
-                # The most robust fallback is to assume independence (covariance = 0).
-                print(f"Warning: Inconsistent data for pair ({s1}, {s2}). Combined reach is too low. Assuming independence.")
+    positive = duplication_prob > 0
+    d_rows, d_cols, d_vals = s1_idx[positive], s2_idx[positive], duplication_prob[positive]
 
-            # The covariance term must be non-negative in this model.
-            lambda_W = max(0, lambda_W)
-
-            # --- Calculate the final model duplication dᵢⱼ for the Gurobi objective ---
-            # dᵢⱼ = 1 – e^-(λᵢ + λⱼ − λ_Wᵢⱼ)
-            exponent = -(lambda1 + lambda2 - lambda_W)
-            duplication_prob = 1 - np.exp(exponent)
-
-            if duplication_prob > 0:
-                d_ij[(s1, s2)] = duplication_prob
+    # A pair listed more than once (e.g. as A-B and B-A) keeps only its last positive row
+    pair_keys = d_rows.astype(np.int64) * len(stations) + d_cols
+    _, last_in_reversed = np.unique(pair_keys[::-1], return_index=True)
+    if len(last_in_reversed) < len(pair_keys):
+        keep = len(pair_keys) - 1 - last_in_reversed
+        d_rows, d_cols, d_vals = d_rows[keep], d_cols[keep], d_vals[keep]
 
     # --- ALGORITHM STEP 3: Build and Configure the Gurobi Model ---
     model = gp.Model("MediaPlanOptimizer")
 
-    # 1. Decision Variables: xᵢ = 1 if we buy station i, 0 otherwise
-    x = model.addVars(stations, vtype=GRB.BINARY, name="x")
+    # 1. Decision Variables: xᵢ = 1 if we buy station i, 0 otherwise (one entry per station)
+    x = model.addMVar(len(stations), vtype=GRB.BINARY, name="x")
 
     # 2. Objective Function: Maximize Net Reach (Second-Order Approximation)
-    # Net Reach ≈ Σ rᵢ * xᵢ - Σ dᵢⱼ * xᵢ * xⱼ
-    linear_part = gp.quicksum(r_i[s] * x[s] for s in stations)
-    quadratic_part = gp.quicksum(d_ij[pair] * x[pair[0]] * x[pair[1]] for pair in d_ij)
-
-    model.setObjective(linear_part - quadratic_part, GRB.MAXIMIZE)
+    # Net Reach ≈ Σ rᵢ * xᵢ - Σ dᵢⱼ * xᵢ * xⱼ  =  r·x - xᵀDx
+    # D is passed to Gurobi directly as COO triplets, so the objective is set in one call.
+    D = sp.coo_matrix((d_vals, (d_rows, d_cols)), shape=(len(stations), len(stations)))
+    model.setMObjective(Q=-D, c=r_i, constant=0.0, xQ_L=x, xQ_R=x, xc=x, sense=GRB.MAXIMIZE)
 
-    # 3. Constraints
-    model.addConstr(gp.quicksum(costs[s] * x[s] for s in stations) <= budget, "Budget")
+    # 3. Constraints (the budget is set by `solve`)
+    budget_constr = model.addConstr(costs @ x <= 0, "Budget")
 
     # 4. Optimizer Settings
     model.setParam('OutputFlag', 0)  # Suppress Gurobi console output
+    model.setParam('Threads', threads)
+    for name, value in {**DEFAULT_SOLVER_PARAMS, **(params or {})}.items():
+        model.setParam(name, value)
+
+    # Keep the data needed to warm-start and report results alongside the model
+    model._stations_df = stations_df
+    model._total_audience = total_audience
+    model._costs = costs
+    model._cumes = cumes
+    model._r_i = r_i
+    model._mip_gap = model.Params.MIPGap
+
+    return model, x, budget_constr
+
+def check_solver_params(params):
+    """
+    Applies solver parameters (on top of DEFAULT_SOLVER_PARAMS) to an empty model.
+    Returns None if Gurobi accepts them all, otherwise Gurobi's error message.
+    """
+    model = gp.Model()
+    model.setParam('OutputFlag', 0)  # Suppress Gurobi console output
+    try:
+        for name, value in {**DEFAULT_SOLVER_PARAMS, **(params or {})}.items():
+            model.setParam(name, value)
+    except gp.GurobiError as e:
+        return f"Invalid solver setting {name}={value}: {e}"
+    finally:
+        model.dispose()
+    return None
+
+def solve(model, x, budget_constr, budget, time_limit=60, start=None, mip_gap=None, return_plan=True):
+    """
+    Solves a model from `build_model` for one budget by updating the budget constraint.
+    `mip_gap` overrides the model's MIPGap for this solve only. With `return_plan=False`
+    the per-station plan records are skipped ("plan" is None) and only totals are reported.
+
+    `start` is an optional 0/1 array (one entry per station) used as the MIP start,
+    e.g. the plan found for a smaller budget. A greedy plan is used otherwise.
+    """
+    stations_df = model._stations_df
+    total_audience = model._total_audience
+
+    budget_constr.RHS = budget
     model.setParam('TimeLimit', time_limit)
-    model.setParam('MIPGap', 0.005) # Target a 0.5% optimality gap
+    model.setParam('MIPGap', model._mip_gap if mip_gap is None else mip_gap)
+
+    # Warm start: give Gurobi a feasible incumbent so it doesn't start cold
+    x.Start = start if start is not None else greedy_start(model._costs, model._r_i, budget)
 
     # --- ALGORITHM STEP 4: Optimize and Extract Results ---
     model.optimize()
@@ -137,14 +247,14 @@ def run_gurobi_optimizer(stations_df, pair_df, total_audience, budget, time_limi
         if model.SolCount == 0:
             return {"error": f"Optimizer timed out after {time_limit}s without finding a feasible solution for the given budget."}
 
-        selected_stations_list = [s for s in stations if x[s].X > 0.5]
-        plan = stations_df[stations_df['Station'].isin(selected_stations_list)].to_dict('records')
-        total_cost = sum(s['Cost'] for s in plan)
+        selected = x.X > 0.5
+        plan = stations_df[selected].to_dict('records') if return_plan else None
+        total_cost = float(model._costs[selected].sum())
 
         # Calculate final metrics from the model's objective value
         net_reach_prob = model.ObjVal
         net_reach_people = net_reach_prob * total_audience
-        total_gross_cume = sum(s['Cume'] for s in plan)
+        total_gross_cume = float(model._cumes[selected].sum())
 
         grps = (total_gross_cume / total_audience) * 100 if total_audience > 0 else 0
         avg_frequency = total_gross_cume / net_reach_people if net_reach_people > 0 else 0
@@ -162,3 +272,11 @@ def run_gurobi_optimizer(stations_df, pair_df, total_audience, budget, time_limi
         return {"error": "The problem is infeasible. This likely means the budget is too low to purchase even the cheapest station."}
     else:
         return {"error": f"Optimizer failed with status code: {model.status}. Please check inputs and budget."}
+
+def run_gurobi_optimizer(stations_df, pair_df, total_audience, budget, time_limit=60, start=None):
+    """Builds the model and solves it for a single budget."""
+    if total_audience <= 0:
+        return {"error": "Total Audience must be a positive number."}
+
+    model, x, budget_constr = build_model(stations_df, pair_df, total_audience)
+    return solve(model, x, budget_constr, budget, time_limit=time_limit, start=start)